@@ -108,7 +108,7 @@ class AgentContext:
             "created_at": (
                 Localization.get().serialize_datetime(self.created_at)
                 if self.created_at
-                else Localization.get().serialize_datetime(datetime.fromtimestamp(0))
+                else Localization.get().serialize_datetime(datetime.fromtimestamp(0, timezone.utc))
             ),
             "no": self.no,
             "log_guid": self.log.guid,
@@ -118,7 +118,7 @@ class AgentContext:
             "last_message": (
                 Localization.get().serialize_datetime(self.last_message)
                 if self.last_message
-                else Localization.get().serialize_datetime(datetime.fromtimestamp(0))
+                else Localization.get().serialize_datetime(datetime.fromtimestamp(0, timezone.utc))
             ),
             "type": self.type.value,
         }
@@ -6,6 +6,11 @@
 python /a0/prepare.py --dockerized=true
 python /a0/preload.py --dockerized=true
 
+# generate API handler registry for the code actually in /a0
+if [ -f /a0/update_api_registry.py ]; then
+    python /a0/update_api_registry.py
+fi
+
 echo "Starting A0..."
 exec python /a0/run_ui.py \
     --dockerized=true \
@@ -1,4 +1,6 @@
+import asyncio
 from enum import Enum
+import functools
 import logging
 import os
 from typing import (
@@ -10,16 +12,17 @@ from typing import (
     Iterator,
     AsyncIterator,
     Tuple,
-    TypedDict,
 )
 
-from litellm import completion, acompletion, embedding
+from litellm import completion, acompletion, embedding, aembedding
 import litellm
+from litellm.types.utils import Delta
+import numpy as np
+import orjson
 
 from python.helpers import dotenv
 from python.helpers.dotenv import load_dotenv
 from python.helpers.rate_limiter import RateLimiter
-from python.helpers.tokens import approximate_tokens
 
 from langchain_core.language_models.chat_models import SimpleChatModel
 from langchain_core.outputs.chat_generation import ChatGenerationChunk
@@ -37,14 +40,29 @@ from langchain.embeddings.base import Embeddings
 from sentence_transformers import SentenceTransformer
 
 
+# LiteLLM loggers found so far, rescanned only when new loggers are registered
+_litellm_loggers: list[logging.Logger] = []
+_litellm_loggers_scanned = 0
+
+
 # disable extra logging, must be done repeatedly, otherwise browser-use will turn it back on for some reason
-def turn_off_logging():
+def turn_off_logging() -> None:
+    global _litellm_loggers_scanned
     os.environ["LITELLM_LOG"] = "ERROR"  # only errors
     litellm.suppress_debug_info = True
     # Silence **all** LiteLLM sub-loggers (utils, cost_calculator…)
-    for name in logging.Logger.manager.loggerDict:
-        if name.lower().startswith("litellm"):
-            logging.getLogger(name).setLevel(logging.ERROR)
+    logger_dict = logging.Logger.manager.loggerDict
+    if len(logger_dict) != _litellm_loggers_scanned:
+        _litellm_loggers[:] = [
+            logging.getLogger(name)
+            for name in list(logger_dict)
+            if name.lower().startswith("litellm")
+        ]
+        _litellm_loggers_scanned = len(logger_dict)
+    for logger in _litellm_loggers:
+        # setLevel clears the logging cache, only call it when the level was changed
+        if logger.level != logging.ERROR:
+            logger.setLevel(logging.ERROR)
 
 
 # init
@@ -73,23 +91,36 @@ class ModelProvider(Enum):
     OTHER = "Other OpenAI compatible"
 
 
-class ChatChunk(TypedDict):
-    """Simplified response chunk for chat models."""
-
-    response_delta: str
-    reasoning_delta: str
+# Simplified response chunk for chat models: (response_delta, reasoning_delta)
+ChatChunk = Tuple[str, str]
 
 
 rate_limiters: dict[str, RateLimiter] = {}
 
+# rough chars-per-token ratio used to count streamed output cheaply
+_APPROX_CHARS_PER_TOKEN = 4
 
+# Map LangChain message types to LiteLLM roles
+ROLE_MAPPING = {
+    "human": "user",
+    "ai": "assistant",
+    "system": "system",
+    "tool": "tool",
+}
+
+
+# cached per service, cleared whenever .env is reloaded
+@functools.lru_cache(maxsize=64)
 def get_api_key(service: str) -> str:
-    return (
-        dotenv.get_dotenv_value(f"API_KEY_{service.upper()}")
-        or dotenv.get_dotenv_value(f"{service.upper()}_API_KEY")
-        or dotenv.get_dotenv_value(f"{service.upper()}_API_TOKEN")
-        or "None"
-    )
+    service = service.upper()
+    for key in (f"API_KEY_{service}", f"{service}_API_KEY", f"{service}_API_TOKEN"):
+        value = dotenv.get_dotenv_value(key)
+        if value:
+            return value
+    return "None"
+
+
+dotenv.on_reload(get_api_key.cache_clear)
 
 
 def get_rate_limiter(
@@ -116,53 +147,48 @@ class LiteLLMChatWrapper(SimpleChatModel):
     def _llm_type(self) -> str:
         return "litellm-chat"
 
+    def _merge_kwargs(self, kwargs: dict) -> dict:
+        # avoid copying the model kwargs when there is nothing to override
+        return {**self.kwargs, **kwargs} if kwargs else self.kwargs
+
     def _convert_messages(self, messages: List[BaseMessage]) -> List[dict]:
-        result = []
-        # Map LangChain message types to LiteLLM roles
-        role_mapping = {
-            "human": "user",
-            "ai": "assistant",
-            "system": "system",
-            "tool": "tool",
-        }
-        for m in messages:
-            role = role_mapping.get(m.type, m.type)
-            message_dict = {"role": role, "content": m.content}
-
-            # Handle tool calls for AI messages
-            tool_calls = getattr(m, "tool_calls", None)
-            if tool_calls:
-                # Convert LangChain tool calls to LiteLLM format
-                new_tool_calls = []
-                for tool_call in tool_calls:
-                    # Ensure arguments is a JSON string
-                    args = tool_call["args"]
-                    if isinstance(args, dict):
-                        import json
-
-                        args_str = json.dumps(args)
-                    else:
-                        args_str = str(args)
-
-                    new_tool_calls.append(
-                        {
-                            "id": tool_call.get("id", ""),
-                            "type": "function",
-                            "function": {
-                                "name": tool_call["name"],
-                                "arguments": args_str,
-                            },
-                        }
-                    )
-                message_dict["tool_calls"] = new_tool_calls
+        return [self._convert_message(m) for m in messages]
+
+    def _convert_message(self, m: BaseMessage) -> dict:
+        role = ROLE_MAPPING.get(m.type, m.type)
+        message_dict: dict[str, Any] = {"role": role, "content": m.content}
+
+        # Handle tool calls for AI messages
+        tool_calls = getattr(m, "tool_calls", None)
+        if tool_calls:
+            # Convert LangChain tool calls to LiteLLM format
+            new_tool_calls = []
+            for tool_call in tool_calls:
+                # Ensure arguments is a JSON string
+                args = tool_call["args"]
+                if isinstance(args, dict):
+                    args_str = orjson.dumps(args).decode("utf-8")
+                else:
+                    args_str = str(args)
+
+                new_tool_calls.append(
+                    {
+                        "id": tool_call.get("id", ""),
+                        "type": "function",
+                        "function": {
+                            "name": tool_call["name"],
+                            "arguments": args_str,
+                        },
+                    }
+                )
+            message_dict["tool_calls"] = new_tool_calls
 
-            # Handle tool call ID for ToolMessage
-            tool_call_id = getattr(m, "tool_call_id", None)
-            if tool_call_id:
-                message_dict["tool_call_id"] = tool_call_id
+        # Handle tool call ID for ToolMessage
+        tool_call_id = getattr(m, "tool_call_id", None)
+        if tool_call_id:
+            message_dict["tool_call_id"] = tool_call_id
 
-            result.append(message_dict)
-        return result
+        return message_dict
 
     def _call(
         self,
@@ -173,10 +199,10 @@ class LiteLLMChatWrapper(SimpleChatModel):
     ) -> str:
         msgs = self._convert_messages(messages)
         resp = completion(
-            model=self.model_name, messages=msgs, stop=stop, **{**self.kwargs, **kwargs}
+            model=self.model_name, messages=msgs, stop=stop, **self._merge_kwargs(kwargs)
         )
-        parsed = _parse_chunk(resp)
-        return parsed["response_delta"]
+        response_delta, _ = _parse_chunk(resp)
+        return response_delta
 
     def _stream(
         self,
@@ -191,13 +217,13 @@ class LiteLLMChatWrapper(SimpleChatModel):
             messages=msgs,
             stream=True,
             stop=stop,
-            **{**self.kwargs, **kwargs},
+            **self._merge_kwargs(kwargs),
         ):
-            parsed = _parse_chunk(chunk)
+            response_delta, _ = _parse_chunk(chunk)
             # Only yield chunks with non-None content
-            if parsed["response_delta"]:
+            if response_delta:
                 yield ChatGenerationChunk(
-                    message=AIMessageChunk(content=parsed["response_delta"])
+                    message=AIMessageChunk(content=response_delta)
                 )
 
     async def _astream(
@@ -213,73 +239,141 @@ class LiteLLMChatWrapper(SimpleChatModel):
             messages=msgs,
             stream=True,
             stop=stop,
-            **{**self.kwargs, **kwargs},
+            **self._merge_kwargs(kwargs),
         )
         async for chunk in response:  # type: ignore
-            parsed = _parse_chunk(chunk)
+            response_delta, _ = _parse_chunk(chunk)
             # Only yield chunks with non-None content
-            if parsed["response_delta"]:
+            if response_delta:
                 yield ChatGenerationChunk(
-                    message=AIMessageChunk(content=parsed["response_delta"])
+                    message=AIMessageChunk(content=response_delta)
                 )
 
     async def unified_call(
         self,
-        system_message="",
-        user_message="",
+        system_message: str = "",
+        user_message: str = "",
         messages: List[BaseMessage] | None = None,
         response_callback: Callable[[str, str], Awaitable[None]] | None = None,
         reasoning_callback: Callable[[str, str], Awaitable[None]] | None = None,
         tokens_callback: Callable[[str, int], Awaitable[None]] | None = None,
+        batch_ms: float = 50,
+        batch_chars: int = 256,
         **kwargs: Any,
     ) -> Tuple[str, str]:
-        if not messages:
-            messages = []
-        # construct messages
+        # construct messages, the caller's list is not modified
+        built: List[BaseMessage] = []
         if system_message:
-            messages.insert(0, SystemMessage(content=system_message))
+            built.append(SystemMessage(content=system_message))
+        if messages:
+            built.extend(messages)
         if user_message:
-            messages.append(HumanMessage(content=user_message))
+            built.append(HumanMessage(content=user_message))
 
         # convert to litellm format
-        msgs_conv = self._convert_messages(messages)
+        msgs_conv = self._convert_messages(built)
 
         # call model
         _completion = await acompletion(
             model=self.model_name,
             messages=msgs_conv,
             stream=True,
-            **{**self.kwargs, **kwargs},
+            **self._merge_kwargs(kwargs),
         )
 
         # results
-        reasoning = ""
-        response = ""
-
-        # iterate over chunks
-        async for chunk in _completion:  # type: ignore
-            parsed = _parse_chunk(chunk)
-            # collect reasoning delta and call callbacks
-            if parsed["reasoning_delta"]:
-                reasoning += parsed["reasoning_delta"]
+        reasoning: str = ""
+        response: str = ""
+
+        # deltas are coalesced and passed to callbacks in batches
+        loop = asyncio.get_running_loop()
+        pending_reasoning: str = ""
+        pending_response: str = ""
+        deadline: float = 0.0
+
+        async def flush() -> None:
+            nonlocal pending_reasoning, pending_response
+            if pending_reasoning:
+                delta, pending_reasoning = pending_reasoning, ""
                 if reasoning_callback:
-                    await reasoning_callback(parsed["reasoning_delta"], reasoning)
+                    await reasoning_callback(delta, reasoning)
                 if tokens_callback:
                     await tokens_callback(
-                        parsed["reasoning_delta"],
-                        approximate_tokens(parsed["reasoning_delta"]),
+                        delta,
+                        (len(delta) + _APPROX_CHARS_PER_TOKEN - 1)
+                        // _APPROX_CHARS_PER_TOKEN,
                     )
-            # collect response delta and call callbacks
-            if parsed["response_delta"]:
-                response += parsed["response_delta"]
+            if pending_response:
+                delta, pending_response = pending_response, ""
                 if response_callback:
-                    await response_callback(parsed["response_delta"], response)
+                    await response_callback(delta, response)
                 if tokens_callback:
                     await tokens_callback(
-                        parsed["response_delta"],
-                        approximate_tokens(parsed["response_delta"]),
+                        delta,
+                        (len(delta) + _APPROX_CHARS_PER_TOKEN - 1)
+                        // _APPROX_CHARS_PER_TOKEN,
                     )
 
+        # read the stream in a separate task, network reads overlap with callbacks
+        queue: asyncio.Queue[ChatChunk | Exception | None] = asyncio.Queue(maxsize=32)
+
+        async def read_stream() -> None:
+            try:
+                async for chunk in _completion:  # type: ignore
+                    await queue.put(_parse_chunk(chunk))
+            except Exception as e:
+                await queue.put(e)
+                return
+            await queue.put(None)
+
+        reader = asyncio.create_task(read_stream())
+
+        # iterate over parsed chunks
+        try:
+            while True:
+                if pending_reasoning or pending_response:
+                    # flush the open batch when the window elapses, even if the stream stalls
+                    timeout = deadline - loop.time()
+                    try:
+                        if timeout <= 0:
+                            raise asyncio.TimeoutError
+                        item = await asyncio.wait_for(queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        await flush()
+                        continue
+                else:
+                    item = await queue.get()
+                if item is None:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                response_delta, reasoning_delta = item
+                if not (response_delta or reasoning_delta):
+                    continue
+                # first delta in an empty batch opens the time window
+                if not (pending_reasoning or pending_response):
+                    deadline = loop.time() + batch_ms / 1000
+                # collect reasoning delta
+                if reasoning_delta:
+                    reasoning += reasoning_delta
+                    pending_reasoning += reasoning_delta
+                # collect response delta
+                if response_delta:
+                    response += response_delta
+                    pending_response += response_delta
+                # call callbacks once the batch is full or the window elapsed
+                if (
+                    len(pending_reasoning) + len(pending_response) >= batch_chars
+                    or loop.time() >= deadline
+                ):
+                    await flush()
+        finally:
+            if not reader.done():
+                reader.cancel()
+
+        # flush the rest of the stream
+        await flush()
+
         # return complete results
         return response, reasoning
 
@@ -320,27 +414,90 @@ class BrowserCompatibleChatWrapper(LiteLLMChatWrapper):
 class LiteLLMEmbeddingWrapper(Embeddings):
     model_name: str
     kwargs: dict = {}
+    # async queries arriving within this window (seconds) share one request
+    batch_window: float = 0.005
 
     def __init__(self, model: str, provider: str, **kwargs: Any):
         self.model_name = f"{provider}/{model}" if provider != "openai" else model
         self.kwargs = kwargs
+        self._pending: dict[asyncio.AbstractEventLoop, list[tuple[str, asyncio.Future]]] = {}
+        self._flush_tasks: set[asyncio.Task] = set()
 
     def embed_documents(self, texts: List[str]) -> List[List[float]]:
         resp = embedding(model=self.model_name, input=texts, **self.kwargs)
-        return [
-            item.get("embedding") if isinstance(item, dict) else item.embedding  # type: ignore
-            for item in resp.data  # type: ignore
-        ]
+        return [_get_embedding(item) for item in resp.data]  # type: ignore
 
     def embed_query(self, text: str) -> List[float]:
         resp = embedding(model=self.model_name, input=[text], **self.kwargs)
-        item = resp.data[0]  # type: ignore
-        return item.get("embedding") if isinstance(item, dict) else item.embedding  # type: ignore
+        return _get_embedding(resp.data[0])  # type: ignore
+
+    async def aembed_query(self, text: str) -> List[float]:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        batch = self._pending.get(loop)
+        if batch is None:
+            # first query in the window schedules the batched request
+            batch = self._pending[loop] = []
+            task = loop.create_task(self._flush(loop, batch))
+            self._flush_tasks.add(task)
+            task.add_done_callback(self._flush_tasks.discard)
+            # also runs when the task is cancelled before it started
+            task.add_done_callback(
+                lambda _, batch=batch: self._discard_batch(loop, batch)
+            )
+        batch.append((text, future))
+        return await future
+
+    async def _flush(
+        self, loop: asyncio.AbstractEventLoop, batch: list[tuple[str, asyncio.Future]]
+    ):
+        await asyncio.sleep(self.batch_window)
+        self._detach_batch(loop, batch)
+        try:
+            resp = await aembedding(
+                model=self.model_name, input=[text for text, _ in batch], **self.kwargs
+            )
+            vectors = [_get_embedding(item) for item in resp.data]  # type: ignore
+            if len(vectors) != len(batch):
+                raise ValueError(
+                    f"Embedding provider returned {len(vectors)} vectors for {len(batch)} inputs"
+                )
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), vector in zip(batch, vectors):
+            if not future.done():
+                future.set_result(vector)
+
+    def _detach_batch(
+        self, loop: asyncio.AbstractEventLoop, batch: list[tuple[str, asyncio.Future]]
+    ):
+        # stop collecting into this batch, a later query starts a new one
+        if self._pending.get(loop) is batch:
+            del self._pending[loop]
+
+    def _discard_batch(
+        self, loop: asyncio.AbstractEventLoop, batch: list[tuple[str, asyncio.Future]]
+    ):
+        # flush task ended without settling these (cancelled), do not leave callers waiting
+        self._detach_batch(loop, batch)
+        for _, future in batch:
+            if not future.done():
+                future.cancel()
+
+
+def _get_embedding(item: Any) -> List[float]:
+    return item.get("embedding") if isinstance(item, dict) else item.embedding
 
 
 class LocalSentenceTransformerWrapper(Embeddings):
     """Local wrapper for sentence-transformers models to avoid HuggingFace API calls"""
 
+    # vectors are L2 normalized, stored embeddings from before need to be recomputed
+    embedding_variant = "normalized"
+
     def __init__(self, provider: str, model: str, **kwargs: Any):
         # Remove the "sentence-transformers/" prefix if present
         if model.startswith("sentence-transformers/"):
@@ -350,15 +507,46 @@ class LocalSentenceTransformerWrapper(Embeddings):
         self.model_name = model
 
     def embed_documents(self, texts: List[str]) -> List[List[float]]:
-        embeddings = self.model.encode(texts, convert_to_tensor=False)  # type: ignore
-        return embeddings.tolist() if hasattr(embeddings, "tolist") else embeddings  # type: ignore
+        return self._encode(texts).tolist()
 
     def embed_query(self, text: str) -> List[float]:
-        embedding = self.model.encode([text], convert_to_tensor=False)  # type: ignore
-        result = (
-            embedding[0].tolist() if hasattr(embedding[0], "tolist") else embedding[0]
+        return self._encode([text])[0].tolist()
+
+    def embed_documents_int8(self, texts: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """Embed texts as int8 vectors with a per-vector float32 scale (vector ~= q * scale)."""
+        return quantize_int8(self._encode(texts))
+
+    def embed_query_int8(self, text: str) -> Tuple[np.ndarray, np.ndarray]:
+        q, scale = quantize_int8(self._encode([text]))
+        return q[0], scale[0]
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        embeddings = self.model.encode(
+            texts,
+            batch_size=64,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            show_progress_bar=False,
         )
-        return result  # type: ignore
+        return np.asarray(embeddings, dtype=np.float32)
+
+
+def quantize_int8(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Symmetric per-vector int8 quantization, returns (int8 vectors, float32 scales)."""
+    scale = np.abs(vectors).max(axis=-1) / 127
+    scale[scale == 0] = 1
+    q = np.clip(np.rint(vectors / scale[..., None]), -127, 127).astype(np.int8)
+    return q, scale.astype(np.float32)
+
+
+def int8_similarity(
+    query: Tuple[np.ndarray, np.ndarray], docs: Tuple[np.ndarray, np.ndarray]
+) -> np.ndarray:
+    """Approximate dot product (cosine for normalized embeddings) of a quantized query against quantized docs."""
+    q, q_scale = query
+    d, d_scale = docs
+    dots = d.astype(np.int32) @ q.astype(np.int32)
+    return dots * d_scale * q_scale
 
 
 def _get_litellm_chat(
@@ -407,8 +595,21 @@ def _get_litellm_embedding(model_name: str, provider_name: str, **kwargs: Any):
 
 
 def _parse_chunk(chunk: Any) -> ChatChunk:
-    delta = chunk["choices"][0].get("delta", {})
-    message = chunk["choices"][0].get("model_extra", {}).get("message", {})
+    choice = chunk["choices"][0]
+    delta = choice.get("delta")
+    # fast path for litellm stream deltas, reasoning_content is deleted when not sent
+    if type(delta) is Delta:
+        response_delta = delta.content
+        reasoning_delta = getattr(delta, "reasoning_content", None)
+        if response_delta or reasoning_delta:
+            return response_delta or "", reasoning_delta or ""
+    return _parse_chunk_generic(choice, delta)
+
+
+def _parse_chunk_generic(choice: Any, delta: Any) -> ChatChunk:
+    if delta is None:
+        delta = {}
+    message = choice.get("model_extra", {}).get("message", {})
     response_delta = (
         delta.get("content", "")
         if isinstance(delta, dict)
@@ -423,21 +624,33 @@ def _parse_chunk(chunk: Any) -> ChatChunk:
         if isinstance(delta, dict)
         else getattr(delta, "reasoning_content", "")
     )
-    return ChatChunk(reasoning_delta=reasoning_delta, response_delta=response_delta)
+    return response_delta or "", reasoning_delta or ""
 
 
-def _adjust_call_args(provider_name: str, model_name: str, kwargs: dict):
-    # for openrouter add app reference
-    if provider_name == "openrouter":
-        kwargs["extra_headers"] = {
-            "HTTP-Referer": "https://agent-zero.ai",
-            "X-Title": "Agent Zero",
-        }
+# app reference headers for openrouter
+_OPENROUTER_HEADERS = {
+    "HTTP-Referer": "https://agent-zero.ai",
+    "X-Title": "Agent Zero",
+}
 
+# provider specific call args adjustments, resolved once per provider
+_PROVIDER_TRANSFORMS: dict[str, Callable[[dict], Tuple[str, dict]]] = {
+    # for openrouter add app reference
+    "openrouter": lambda kw: (
+        "openrouter",
+        {**kw, "extra_headers": dict(_OPENROUTER_HEADERS)},
+    ),
     # remap other to openai for litellm
-    if provider_name == "other":
-        provider_name = "openai"
+    "other": lambda kw: ("openai", kw),
+}
+
 
+def _adjust_call_args(
+    provider_name: str, model_name: str, kwargs: dict
+) -> Tuple[str, str, dict]:
+    transform = _PROVIDER_TRANSFORMS.get(provider_name)
+    if transform:
+        provider_name, kwargs = transform(kwargs)
     return provider_name, model_name, kwargs
 
 
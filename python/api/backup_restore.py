@@ -3,6 +3,7 @@ from flask import Request, Response
 from werkzeug.datastructures import FileStorage
 from python.helpers.backup import BackupService
 from python.helpers.persist_chat import load_tmp_chats
+from python.helpers import dotenv
 import json
 
 
@@ -47,6 +48,9 @@ class BackupRestore(ApiHandler):
                 user_edited_metadata=metadata
             )
 
+            # pick up a restored .env, this also drops cached API keys
+            dotenv.load_dotenv()
+
             # Load all chats from the chats folder
             load_tmp_chats()
 
@@ -1,11 +1,10 @@
-import secrets
 from python.helpers.api import (
     ApiHandler,
     Input,
     Output,
     Request,
     Response,
-    session,
+    create_csrf_token,
 )
 from python.helpers import runtime
 
@@ -20,6 +19,6 @@ class GetCsrfToken(ApiHandler):
         return False
 
     async def process(self, input: Input, request: Request) -> Output:
-        if "csrf_token" not in session:
-            session["csrf_token"] = secrets.token_urlsafe(32)
-        return {"token": session["csrf_token"], "runtime_id": runtime.get_runtime_id()}
+        # stateless signed token, the client stores it in the csrf cookie and header
+        runtime_id = runtime.get_runtime_id()
+        return {"token": create_csrf_token(self.app, runtime_id), "runtime_id": runtime_id}
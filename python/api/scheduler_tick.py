@@ -1,4 +1,4 @@
-from datetime import datetime
+from datetime import datetime, timezone
 
 from python.helpers.api import ApiHandler, Input, Output, Request
 from python.helpers.print_style import PrintStyle
@@ -21,10 +21,10 @@ class SchedulerTick(ApiHandler):
 
     async def process(self, input: Input, request: Request) -> Output:
         # Get timezone from input (do not set if not provided, we then rely on poll() to set it)
-        if timezone := input.get("timezone", None):
-            Localization.get().set_timezone(timezone)
+        if tz := input.get("timezone", None):
+            Localization.get().set_timezone(tz)
 
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        timestamp = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
         printer = PrintStyle(font_color="green", padding=False)
         printer.print(f"Scheduler tick - API: {timestamp}")
 
@@ -33,4 +33,4 @@ class TunnelProxy(ApiHandler):
         else:
             # forward to API handler directly
             from python.api.tunnel import Tunnel
-            return await Tunnel(self.app, self.thread_lock).process(input, request)
+            return await Tunnel(self.app, self.locks).process(input, request)
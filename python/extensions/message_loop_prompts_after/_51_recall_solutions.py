@@ -62,17 +62,20 @@ class RecallSolutions(Extension):
         # get solutions database
         db = await Memory.get(self.agent)
 
-        solutions = await db.search_similarity_threshold(
-            query=query,
-            limit=RecallSolutions.SOLUTIONS_COUNT,
-            threshold=RecallSolutions.THRESHOLD,
-            filter=f"area == '{Memory.Area.SOLUTIONS.value}'",
-        )
-        instruments = await db.search_similarity_threshold(
-            query=query,
-            limit=RecallSolutions.INSTRUMENTS_COUNT,
-            threshold=RecallSolutions.THRESHOLD,
-            filter=f"area == '{Memory.Area.INSTRUMENTS.value}'",
+        # search solutions and instruments concurrently
+        solutions, instruments = await asyncio.gather(
+            db.search_similarity_threshold(
+                query=query,
+                limit=RecallSolutions.SOLUTIONS_COUNT,
+                threshold=RecallSolutions.THRESHOLD,
+                filter=f"area == '{Memory.Area.SOLUTIONS.value}'",
+            ),
+            db.search_similarity_threshold(
+                query=query,
+                limit=RecallSolutions.INSTRUMENTS_COUNT,
+                threshold=RecallSolutions.THRESHOLD,
+                filter=f"area == '{Memory.Area.INSTRUMENTS.value}'",
+            ),
         )
 
         log_item.update(
@@ -80,10 +83,7 @@ class RecallSolutions(Extension):
         )
 
         if instruments:
-            instruments_text = ""
-            for instrument in instruments:
-                instruments_text += instrument.page_content + "\n\n"
-            instruments_text = instruments_text.strip()
+            instruments_text = "\n\n".join(instrument.page_content for instrument in instruments).strip()
             log_item.update(instruments=instruments_text)
             instruments_prompt = self.agent.read_prompt(
                 "agent.system.instruments.md", instruments=instruments_text
@@ -91,10 +91,7 @@ class RecallSolutions(Extension):
             loop_data.system.append(instruments_prompt)
 
         if solutions:
-            solutions_text = ""
-            for solution in solutions:
-                solutions_text += solution.page_content + "\n\n"
-            solutions_text = solutions_text.strip()
+            solutions_text = "\n\n".join(solution.page_content for solution in solutions).strip()
             log_item.update(solutions=solutions_text)
             solutions_prompt = self.agent.parse_prompt(
                 "agent.system.solutions.md", solutions=solutions_text
@@ -1,23 +1,63 @@
 from abc import abstractmethod
-import json
+from functools import lru_cache
 import threading
+import weakref
 from typing import Union, TypedDict, Dict, Any
 from attr import dataclass
-from flask import Request, Response, jsonify, Flask, session, request
+from flask import Request, Response, Flask, request
 from agent import AgentContext
 from initialize import initialize_agent
 from python.helpers.print_style import PrintStyle
 from python.helpers.errors import format_error
-from werkzeug.serving import make_server
+from itsdangerous import BadData, URLSafeTimedSerializer
 
 Input = dict
 Output = Union[Dict[str, Any], Response, TypedDict]  # type: ignore
 
+CSRF_TOKEN_MAX_AGE = 86400  # seconds
+
+
+@lru_cache(maxsize=4)
+def _csrf_serializer(secret_key: str | bytes) -> URLSafeTimedSerializer:
+    return URLSafeTimedSerializer(secret_key, salt="csrf-token")
+
+
+def create_csrf_token(app: Flask, runtime_id: str) -> str:
+    return _csrf_serializer(app.secret_key).dumps(runtime_id)  # type: ignore
+
+
+def verify_csrf_token(app: Flask, token: str, runtime_id: str) -> bool:
+    """Token must be signed with the app secret, bound to this runtime and not expired."""
+    try:
+        value = _csrf_serializer(app.secret_key).loads(  # type: ignore
+            token, max_age=CSRF_TOKEN_MAX_AGE
+        )
+    except BadData:
+        return False
+    return value == runtime_id
+
+
+class LockRegistry:
+    """Hands out one lock per key, locks are dropped once nobody holds a reference."""
+
+    def __init__(self):
+        self._locks: weakref.WeakValueDictionary[str, threading.Lock] = (
+            weakref.WeakValueDictionary()
+        )
+        self._meta_lock = threading.Lock()
+
+    def get(self, key: str) -> threading.Lock:
+        with self._meta_lock:
+            lock = self._locks.get(key)
+            if lock is None:
+                lock = self._locks[key] = threading.Lock()  # type: ignore
+            return lock
+
 
 class ApiHandler:
-    def __init__(self, app: Flask, thread_lock: threading.Lock):
+    def __init__(self, app: Flask, locks: LockRegistry):
         self.app = app
-        self.thread_lock = thread_lock
+        self.locks = locks
 
     @classmethod
     def requires_loopback(cls) -> bool:
@@ -66,7 +106,7 @@ class ApiHandler:
             if isinstance(output, Response):
                 return output
             else:
-                response_json = json.dumps(output)
+                response_json = self.app.json.dumps(output)
                 return Response(
                     response=response_json, status=200, mimetype="application/json"
                 )
@@ -79,7 +119,8 @@ class ApiHandler:
 
     # get context to run agent zero in
     def get_context(self, ctxid: str):
-        with self.thread_lock:
+        # only requests for the same context wait for each other
+        with self.locks.get(ctxid or ""):
             if not ctxid:
                 first = AgentContext.first()
                 if first:
@@ -11,7 +11,7 @@ from langchain_unstructured import UnstructuredLoader  # noqa E402
 
 from urllib.parse import urlparse
 from typing import Callable, Sequence, List, Optional, Tuple
-from datetime import datetime
+from datetime import datetime, timezone
 
 from langchain_community.document_loaders import AsyncHtmlLoader
 from langchain_community.document_loaders.text import TextLoader
@@ -120,7 +120,7 @@ class DocumentQueryStore:
         # Initialize metadata
         doc_metadata = metadata or {}
         doc_metadata["document_uri"] = document_uri
-        doc_metadata["timestamp"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        doc_metadata["timestamp"] = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
 
         # Split text into chunks
         text_splitter = RecursiveCharacterTextSplitter(
@@ -1,6 +1,6 @@
 import os
 import re
-from typing import Any
+from typing import Any, Callable
 
 from .files import get_abs_path
 from dotenv import load_dotenv as _load_dotenv
@@ -10,8 +10,18 @@ KEY_AUTH_PASSWORD = "AUTH_PASSWORD"
 KEY_RFC_PASSWORD = "RFC_PASSWORD"
 KEY_ROOT_PASSWORD = "ROOT_PASSWORD"
 
+# called after every (re)load of .env, used to drop caches of env values
+_reload_callbacks: list[Callable[[], None]] = []
+
+
+def on_reload(callback: Callable[[], None]):
+    _reload_callbacks.append(callback)
+
+
 def load_dotenv():
     _load_dotenv(get_dotenv_file_path(), override=True)
+    for callback in _reload_callbacks:
+        callback()
 
 
 def get_dotenv_file_path():
@@ -87,10 +87,12 @@ def read_file(_relative_path, _backup_dirs=None, _encoding="utf-8", **kwargs):
     # Try to get the absolute path for the file from the original directory or backup directories
     absolute_path = find_file_in_dirs(_relative_path, _backup_dirs)
 
-    # Read the file content
-    with open(absolute_path, "r", encoding=_encoding) as f:
-        # content = remove_code_fences(f.read())
-        content = f.read()
+    # Read the file content, prompt templates are cached
+    if _is_prompt_file(absolute_path):
+        content = _read_text_cached(absolute_path, _encoding)
+    else:
+        with open(absolute_path, "r", encoding=_encoding) as f:
+            content = f.read()
 
     variables = load_plugin_variables(_relative_path, _backup_dirs) or {}  # type: ignore
     variables.update(kwargs)
@@ -107,6 +109,39 @@ def read_file(_relative_path, _backup_dirs=None, _encoding="utf-8", **kwargs):
     return content
 
 
+# prompt templates by absolute path -> (mtime_ns, size, encoding, content)
+# only files under prompts/ are cached, they are edited by hand and not rewritten by the app
+_TEXT_CACHE_MAX_ENTRIES = 256
+_TEXT_CACHE_MAX_SIZE = 64 * 1024
+_text_cache: dict[str, tuple[int, int, str, str]] = {}
+
+
+def _is_prompt_file(absolute_path: str) -> bool:
+    return absolute_path.startswith(get_abs_path("prompts") + os.sep)
+
+
+def _read_text_cached(absolute_path: str, encoding: str) -> str:
+    # reuse the content while the file is unchanged, placeholders are still replaced per call
+    stat = os.stat(absolute_path)
+    cached = _text_cache.get(absolute_path)
+    if (
+        cached
+        and cached[0] == stat.st_mtime_ns
+        and cached[1] == stat.st_size
+        and cached[2] == encoding
+    ):
+        return cached[3]
+
+    with open(absolute_path, "r", encoding=encoding) as f:
+        content = f.read()
+
+    if stat.st_size <= _TEXT_CACHE_MAX_SIZE:
+        if len(_text_cache) >= _TEXT_CACHE_MAX_ENTRIES:
+            _text_cache.pop(next(iter(_text_cache)), None)  # drop the oldest entry
+        _text_cache[absolute_path] = (stat.st_mtime_ns, stat.st_size, encoding, content)
+    return content
+
+
 def read_file_bin(_relative_path, _backup_dirs=None):
     # init backup dirs
     if _backup_dirs is None:
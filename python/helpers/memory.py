@@ -1,4 +1,4 @@
-from datetime import datetime
+from datetime import datetime, timezone
 from typing import Any, List, Sequence
 from langchain.storage import InMemoryByteStore, LocalFileStore
 from langchain.embeddings import CacheBackedEmbeddings
@@ -125,8 +125,13 @@ class Memory:
             model_config.name,
             **model_config.kwargs,
         )
+        # variant changes when a wrapper changes its output vectors for the same model
+        embedding_variant = getattr(embeddings_model, "embedding_variant", "")
         embeddings_model_id = files.safe_file_name(
-            model_config.provider.name + "_" + model_config.name
+            model_config.provider.name
+            + "_"
+            + model_config.name
+            + ("_" + embedding_variant if embedding_variant else "")
         )
 
         # here we setup the embeddings model with the chosen cache storage
@@ -159,6 +164,7 @@ class Memory:
                 if (
                     embedding_set["model_provider"] == model_config.provider.name
                     and embedding_set["model_name"] == model_config.name
+                    and embedding_set.get("embedding_variant", "") == embedding_variant
                 ):
                     # model matches
                     emb_ok = True
@@ -199,6 +205,7 @@ class Memory:
                     {
                         "model_provider": model_config.provider.name,
                         "model_name": model_config.name,
+                        "embedding_variant": embedding_variant,
                     }
                 ),
             )
@@ -430,7 +437,7 @@ class Memory:
 
     @staticmethod
     def get_timestamp():
-        return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
 
 
 def get_memory_subdir_abs(agent: Agent) -> str:
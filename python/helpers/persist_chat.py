@@ -1,5 +1,5 @@
 from collections import OrderedDict
-from datetime import datetime
+from datetime import datetime, timezone
 from typing import Any
 import uuid
 from agent import Agent, AgentConfig, AgentContext, AgentContextType
@@ -113,12 +113,12 @@ def _serialize_context(context: AgentContext):
         "name": context.name,
         "created_at": (
             context.created_at.isoformat() if context.created_at
-            else datetime.fromtimestamp(0).isoformat()
+            else datetime.fromtimestamp(0, timezone.utc).isoformat()
         ),
         "type": context.type.value,
         "last_message": (
             context.last_message.isoformat() if context.last_message
-            else datetime.fromtimestamp(0).isoformat()
+            else datetime.fromtimestamp(0, timezone.utc).isoformat()
         ),
         "agents": agents,
         "streaming_agent": (
@@ -162,13 +162,13 @@ def _deserialize_context(data):
         created_at=(
             datetime.fromisoformat(
                 # older chats may not have created_at - backcompat
-                data.get("created_at", datetime.fromtimestamp(0).isoformat())
+                data.get("created_at", datetime.fromtimestamp(0, timezone.utc).isoformat())
             )
         ),
         type=AgentContextType(data.get("type", AgentContextType.USER.value)),
         last_message=(
             datetime.fromisoformat(
-                data.get("last_message", datetime.fromtimestamp(0).isoformat())
+                data.get("last_message", datetime.fromtimestamp(0, timezone.utc).isoformat())
             )
         ),
         log=log,
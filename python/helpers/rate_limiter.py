@@ -1,56 +1,63 @@
 import asyncio
+import math
 import time
 from typing import Callable, Awaitable
 
 
 class RateLimiter:
+    """Token bucket limiter, each key refills at limit/seconds per second up to its limit."""
+
     def __init__(self, seconds: int = 60, **limits: int):
         self.timeframe = seconds
         self.limits = {key: value if isinstance(value, (int, float)) else 0 for key, value in (limits or {}).items()}
-        self.values = {key: [] for key in self.limits.keys()}
-        self._lock = asyncio.Lock()
+        self.tokens: dict[str, float] = {}
+        self.last_refill: dict[str, float] = {}
+
+    def _refill(self, key: str, now: float) -> float:
+        capacity = self.limits.get(key, 0)
+        if capacity > 0:
+            tokens = self.tokens.get(key, capacity)
+            elapsed = now - self.last_refill.get(key, now)
+            tokens = min(capacity, tokens + elapsed * capacity / self.timeframe)
+        else:
+            tokens = 0  # unlimited, do not accumulate debt
+        self.tokens[key] = tokens
+        self.last_refill[key] = now
+        return tokens
 
     def add(self, **kwargs: int):
-        now = time.time()
+        now = time.monotonic()
         for key, value in kwargs.items():
-            if not key in self.values:
-                self.values[key] = []
-            self.values[key].append((now, value))
-
-    async def cleanup(self):
-        async with self._lock:
-            now = time.time()
-            cutoff = now - self.timeframe
-            for key in self.values:
-                self.values[key] = [(t, v) for t, v in self.values[key] if t > cutoff]
+            # consumption may go below zero, wait() blocks until the debt is refilled
+            self.tokens[key] = self._refill(key, now) - value
 
     async def get_total(self, key: str) -> int:
-        async with self._lock:
-            if not key in self.values:
-                return 0
-            return sum(value for _, value in self.values[key])
+        # amount consumed and not yet refilled
+        tokens = self._refill(key, time.monotonic())
+        return math.ceil(self.limits.get(key, 0) - tokens)
 
     async def wait(
         self,
         callback: Callable[[str, str, int, int], Awaitable[None]] | None = None,
     ):
         while True:
-            await self.cleanup()
-            should_wait = False
+            now = time.monotonic()
+            delay = 0.0
 
             for key, limit in self.limits.items():
                 if limit <= 0:  # Skip if no limit set
                     continue
 
-                total = await self.get_total(key)
-                if total > limit:
+                tokens = self._refill(key, now)
+                if tokens < 0:
                     if callback:
+                        total = math.ceil(limit - tokens)
                         msg = f"Rate limit exceeded for {key} ({total}/{limit}), waiting..."
                         await callback(msg, key, total, limit)
-                    should_wait = True
+                    delay = -tokens * self.timeframe / limit
                     break
 
-            if not should_wait:
+            if delay <= 0:
                 break
 
-            await asyncio.sleep(1)
+            await asyncio.sleep(delay)
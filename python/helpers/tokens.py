@@ -1,3 +1,4 @@
+from functools import lru_cache
 from typing import Literal
 import tiktoken
 
@@ -5,15 +6,20 @@ APPROX_BUFFER = 1.1
 TRIM_BUFFER = 0.8
 
 
+@lru_cache(maxsize=None)
+def _get_encoding(encoding_name: str) -> tiktoken.Encoding:
+    return tiktoken.get_encoding(encoding_name)
+
+
 def count_tokens(text: str, encoding_name="cl100k_base") -> int:
     if not text:
         return 0
 
     # Get the encoding
-    encoding = tiktoken.get_encoding(encoding_name)
+    encoding = _get_encoding(encoding_name)
 
-    # Encode the text and count the tokens
-    tokens = encoding.encode(text)
+    # Encode the text and count the tokens, special tokens are counted as plain text
+    tokens = encoding.encode_ordinary(text)
     token_count = len(tokens)
 
     return token_count
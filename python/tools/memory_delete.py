@@ -6,8 +6,9 @@ class MemoryDelete(Tool):
 
     async def execute(self, ids="", **kwargs):
         db = await Memory.get(self.agent)
-        ids = [id.strip() for id in ids.split(",") if id.strip()]
-        dels = await db.delete_documents_by_ids(ids=ids)
+        # unique ids in original order, the whole list is removed in one call and one save
+        ids = list(dict.fromkeys(id.strip() for id in ids.split(",") if id.strip()))
+        dels = await db.delete_documents_by_ids(ids=ids) if ids else []
 
         result = self.agent.read_prompt("fw.memories_deleted.md", memory_count=len(dels))
         return Response(message=result, break_loop=False)
@@ -1,7 +1,7 @@
-import threading
 from flask import Flask, request
 from python.helpers import runtime, dotenv, process
 from python.helpers.print_style import PrintStyle
+from python.helpers.api import LockRegistry
 
 from python.api.tunnel import Tunnel
 
@@ -27,8 +27,7 @@ def run():
         runtime.get_arg("host") or dotenv.get_dotenv_value("WEB_UI_HOST") or "localhost"
     )
     server = None
-    lock = threading.Lock()
-    tunnel = Tunnel(app, lock)
+    tunnel = Tunnel(app, LockRegistry())
 
     # handle api request
     @app.route("/", methods=["POST"])
@@ -1,201 +1,283 @@
-from datetime import timedelta
+import asyncio
+import decimal
 import os
 import secrets
 import sys
-import time
 import socket
-import struct
-from functools import wraps
+from functools import lru_cache, wraps
+import hmac
+import ipaddress
 import threading
 import signal
 from typing import override
-from flask import Flask, request, Response, session
+from flask import Flask, request, Response
+from flask.json.provider import JSONProvider
+import orjson
 from flask_basicauth import BasicAuth
 import initialize
 from python.helpers import errors, files, git, mcp_server
 from python.helpers.files import get_abs_path
 from python.helpers import runtime, dotenv, process
 from python.helpers.extract_tools import load_classes_from_folder
-from python.helpers.api import ApiHandler
+from python.helpers.api import ApiHandler, LockRegistry, verify_csrf_token
 from python.helpers.print_style import PrintStyle
 
-# OpenTelemetry auto-instrumentation setup
-try:
-    from opentelemetry import trace
-    from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
-    from opentelemetry.sdk.trace import TracerProvider
-    from opentelemetry.sdk.trace.export import BatchSpanProcessor
-    from opentelemetry.instrumentation.flask import FlaskInstrumentor
-    from opentelemetry.instrumentation.requests import RequestsInstrumentor
-    from opentelemetry.instrumentation.urllib3 import URLLib3Instrumentor
-    from opentelemetry.sdk.resources import Resource
-    
-    # Configure OTEL resource
-    resource = Resource.create({
-        "service.name": "agent-zero",
-        "service.version": "v0.8.5.1",
-        "deployment.environment": "production"
-    })
-    
-    # Set up tracer provider
-    trace.set_tracer_provider(TracerProvider(resource=resource))
-    tracer = trace.get_tracer(__name__)
-    
-    # Configure OTLP exporter to ClickStack
-    otlp_exporter = OTLPSpanExporter(
-        endpoint="http://clickstack-clickstack-hdx-oss-v2-otel-collector.clickstack.svc.cluster.local:4318/v1/traces",
-        headers={"authorization": os.getenv("HYPERDX_API_KEY")}
-    )
-    
-    # Add span processor
-    span_processor = BatchSpanProcessor(otlp_exporter)
-    trace.get_tracer_provider().add_span_processor(span_processor)
-    
-    # Auto-instrument common libraries
-    RequestsInstrumentor().instrument()
-    URLLib3Instrumentor().instrument()
-    
-    PrintStyle(font_color="green").print("✅ OpenTelemetry auto-instrumentation initialized")
-    OTEL_ENABLED = True
-    
-except ImportError as e:
-    PrintStyle(font_color="yellow").print(f"⚠️ OpenTelemetry not available: {e}")
-    OTEL_ENABLED = False
-except Exception as e:
-    PrintStyle(font_color="red").print(f"❌ OpenTelemetry initialization failed: {e}")
-    OTEL_ENABLED = False
-
-
-# Set the new timezone to 'UTC'
-os.environ["TZ"] = "UTC"
-# Apply the timezone change
-time.tzset()
+# set by init_otel() once tracing is configured
+OTEL_ENABLED = False
+
+
+class OrjsonProvider(JSONProvider):
+    """Flask JSON provider backed by orjson, keys are not sorted."""
+
+    @staticmethod
+    def _default(o):
+        if hasattr(o, "__html__"):
+            return str(o.__html__())
+        if isinstance(o, decimal.Decimal):
+            return str(o)
+        raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self._default, option=orjson.OPT_NON_STR_KEYS).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
 
 # initialize the internal Flask server
 webapp = Flask("app", static_folder=get_abs_path("./webui"), static_url_path="/")
+webapp.json = OrjsonProvider(webapp)
 webapp.secret_key = os.getenv("FLASK_SECRET_KEY") or secrets.token_hex(32)
-webapp.config.update(
-    JSON_SORT_KEYS=False,
-    SESSION_COOKIE_NAME="session_" + runtime.get_runtime_id(),  # bind the session cookie name to runtime id to prevent session collision on same host
-    SESSION_COOKIE_SAMESITE="Strict",
-    SESSION_PERMANENT=True,
-    PERMANENT_SESSION_LIFETIME=timedelta(days=1)
-)
+# cookie name bound to runtime id to prevent collisions on same host
+RUNTIME_ID = runtime.get_runtime_id()
+CSRF_COOKIE_NAME = "csrf_token_" + RUNTIME_ID
+
+webapp.config.update(JSON_SORT_KEYS=False)
+
+
+# OpenTelemetry auto-instrumentation setup, skipped entirely with OTEL_SDK_DISABLED=true
+def init_otel():
+    global OTEL_ENABLED
+    if os.getenv("OTEL_SDK_DISABLED", "false").lower() == "true":
+        PrintStyle(font_color="yellow").print("⚠️ OpenTelemetry disabled by OTEL_SDK_DISABLED")
+        return
+
+    try:
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+        from opentelemetry import trace
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+        from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+        from opentelemetry.instrumentation.flask import FlaskInstrumentor
+        from opentelemetry.instrumentation.requests import RequestsInstrumentor
+        from opentelemetry.instrumentation.urllib3 import URLLib3Instrumentor
+        from opentelemetry.sdk.resources import Resource
+
+        # Configure OTEL resource
+        resource = Resource.create({
+            "service.name": "agent-zero",
+            "service.version": "v0.8.5.1",
+            "deployment.environment": "production"
+        })
+
+        # Set up tracer provider, sample root spans and follow the parent decision otherwise
+        sample_ratio = float(os.getenv("OTEL_TRACES_SAMPLER_ARG", 0.1))
+        trace.set_tracer_provider(
+            TracerProvider(
+                resource=resource,
+                sampler=ParentBased(root=TraceIdRatioBased(sample_ratio)),
+            )
+        )
+
+        # Keep-alive connection pool for span export
+        otlp_session = requests.Session()
+        otlp_adapter = HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=16,
+            max_retries=Retry(total=3, backoff_factor=0.1),
+        )
+        otlp_session.mount("http://", otlp_adapter)
+        otlp_session.mount("https://", otlp_adapter)
+        otlp_session.headers["Connection"] = "keep-alive"
+
+        # Configure OTLP exporter to ClickStack
+        otlp_exporter = OTLPSpanExporter(
+            endpoint="http://clickstack-clickstack-hdx-oss-v2-otel-collector.clickstack.svc.cluster.local:4318/v1/traces",
+            headers={"authorization": os.getenv("HYPERDX_API_KEY")},
+            session=otlp_session,
+        )
 
+        # Add span processor, batching can be tuned with the standard OTEL_BSP_* env vars
+        span_processor = BatchSpanProcessor(
+            otlp_exporter,
+            max_queue_size=int(os.getenv("OTEL_BSP_MAX_QUEUE_SIZE", 4096)),
+            schedule_delay_millis=float(os.getenv("OTEL_BSP_SCHEDULE_DELAY", 1000)),
+            max_export_batch_size=int(os.getenv("OTEL_BSP_MAX_EXPORT_BATCH_SIZE", 256)),
+            export_timeout_millis=float(os.getenv("OTEL_BSP_EXPORT_TIMEOUT", 10000)),
+        )
+        trace.get_tracer_provider().add_span_processor(span_processor)
+
+        # Auto-instrument common libraries
+        RequestsInstrumentor().instrument()
+        URLLib3Instrumentor().instrument()
+
+        PrintStyle(font_color="green").print("✅ OpenTelemetry auto-instrumentation initialized")
+        OTEL_ENABLED = True
+
+    except ImportError as e:
+        PrintStyle(font_color="yellow").print(f"⚠️ OpenTelemetry not available: {e}")
+        return
+    except Exception as e:
+        PrintStyle(font_color="red").print(f"❌ OpenTelemetry initialization failed: {e}")
+        return
 
-# Auto-instrument Flask app
-if OTEL_ENABLED:
+    # Auto-instrument Flask app
     try:
-        FlaskInstrumentor().instrument_app(webapp)
+        # static UI assets are served from the root, skip them by extension
+        excluded_urls = os.getenv(
+            "OTEL_PYTHON_FLASK_EXCLUDED_URLS",
+            r"\.(?:css|js|mjs|map|html|png|jpe?g|gif|svg|ico|webp|woff2?|ttf)(?:\?.*)?$",
+        )
+        FlaskInstrumentor().instrument_app(webapp, excluded_urls=excluded_urls)
         PrintStyle(font_color="green").print("✅ Flask auto-instrumentation enabled")
     except Exception as e:
         PrintStyle(font_color="red").print(f"❌ Flask instrumentation failed: {e}")
 
-lock = threading.Lock()
+
+# per-context locks shared by all API handlers
+locks = LockRegistry()
+
 
 # Set up basic authentication for UI and API but not MCP
 basic_auth = BasicAuth(webapp)
 
 
+# most loopback-restricted requests come from these, skip parsing for them
+_LOOPBACK_LITERALS = frozenset(("127.0.0.1", "::1", "localhost"))
+
+
 def is_loopback_address(address):
-    loopback_checker = {
-        socket.AF_INET: lambda x: struct.unpack("!I", socket.inet_aton(x))[0]
-        >> (32 - 8)
-        == 127,
-        socket.AF_INET6: lambda x: x == "::1",
-    }
-    address_type = "hostname"
+    if address in _LOOPBACK_LITERALS:
+        return True
     try:
-        socket.inet_pton(socket.AF_INET6, address)
-        address_type = "ipv6"
-    except socket.error:
+        return ipaddress.ip_address(address).is_loopback
+    except ValueError:
+        return _is_loopback_hostname(address)
+
+
+@lru_cache(maxsize=256)
+def _is_loopback_hostname(hostname):
+    # all addresses the hostname resolves to must be loopback
+    for family in (socket.AF_INET, socket.AF_INET6):
         try:
-            socket.inet_pton(socket.AF_INET, address)
-            address_type = "ipv4"
-        except socket.error:
-            address_type = "hostname"
-
-    if address_type == "ipv4":
-        return loopback_checker[socket.AF_INET](address)
-    elif address_type == "ipv6":
-        return loopback_checker[socket.AF_INET6](address)
-    else:
-        for family in (socket.AF_INET, socket.AF_INET6):
-            try:
-                r = socket.getaddrinfo(address, None, family, socket.SOCK_STREAM)
-            except socket.gaierror:
+            r = socket.getaddrinfo(hostname, None, family, socket.SOCK_STREAM)
+        except socket.gaierror:
+            return False
+        for _, _, _, _, sockaddr in r:
+            if not ipaddress.ip_address(sockaddr[0]).is_loopback:
                 return False
-            for family, _, _, _, sockaddr in r:
-                if not loopback_checker[family](sockaddr[0]):
-                    return False
-        return True
+    return True
 
 
-def requires_api_key(f):
-    @wraps(f)
-    async def decorated(*args, **kwargs):
-        valid_api_key = dotenv.get_dotenv_value("API_KEY")
-        if api_key := request.headers.get("X-API-KEY"):
-            if api_key != valid_api_key:
-                return Response("API key required", 401)
-        elif request.json and request.json.get("api_key"):
-            api_key = request.json.get("api_key")
-            if api_key != valid_api_key:
-                return Response("API key required", 401)
-        else:
-            return Response("API key required", 401)
-        return await f(*args, **kwargs)
+# constant time comparison for secrets
+def _safe_equals(a: str, b: str) -> bool:
+    return hmac.compare_digest(str(a).encode(), str(b).encode())
 
-    return decorated
+
+def check_api_key():
+    valid_api_key = dotenv.get_dotenv_value("API_KEY")
+    if not valid_api_key:
+        return Response("API key required", 401)
+    api_key = request.headers.get("X-API-KEY")
+    if not api_key:
+        # parse the body once, non-JSON bodies are treated as missing key
+        payload = request.get_json(silent=True)
+        api_key = payload.get("api_key") if isinstance(payload, dict) else None
+    if not api_key or not _safe_equals(api_key, valid_api_key):
+        return Response("API key required", 401)
+    return None
 
 
 # allow only loopback addresses
-def requires_loopback(f):
-    @wraps(f)
-    async def decorated(*args, **kwargs):
-        if not is_loopback_address(request.remote_addr):
+def check_loopback():
+    if not is_loopback_address(request.remote_addr):
+        return Response(
+            "Access denied.",
+            403,
+            {},
+        )
+    return None
+
+
+# require authentication for handlers
+def check_auth():
+    user = dotenv.get_dotenv_value("AUTH_LOGIN")
+    password = dotenv.get_dotenv_value("AUTH_PASSWORD")
+    if user and password:
+        auth = request.authorization
+        if not auth or not (auth.username == user and auth.password == password):
             return Response(
-                "Access denied.",
-                403,
-                {},
+                "Could not verify your access level for that URL.\n"
+                "You have to login with proper credentials",
+                401,
+                {"WWW-Authenticate": 'Basic realm="Login Required"'},
             )
-        return await f(*args, **kwargs)
+    return None
 
-    return decorated
 
+def check_csrf():
+    header = request.headers.get("X-CSRF-Token")
+    cookie = request.cookies.get(CSRF_COOKIE_NAME)
+    sent = header or cookie
+    if not sent or not verify_csrf_token(webapp, sent, RUNTIME_ID):
+        return Response("CSRF token missing or invalid", 403)
+    return None
+
+
+# wrap a handler with request checks, run in order in a single frame, first failure is returned
+def guarded(f, *checks):
+    if not checks:
+        return f
 
-# require authentication for handlers
-def requires_auth(f):
     @wraps(f)
     async def decorated(*args, **kwargs):
-        user = dotenv.get_dotenv_value("AUTH_LOGIN")
-        password = dotenv.get_dotenv_value("AUTH_PASSWORD")
-        if user and password:
-            auth = request.authorization
-            if not auth or not (auth.username == user and auth.password == password):
-                return Response(
-                    "Could not verify your access level for that URL.\n"
-                    "You have to login with proper credentials",
-                    401,
-                    {"WWW-Authenticate": 'Basic realm="Login Required"'},
-                )
+        for check in checks:
+            if (error := check()) is not None:
+                return error
         return await f(*args, **kwargs)
 
     return decorated
 
 
+def requires_api_key(f):
+    return guarded(f, check_api_key)
+
+
+def requires_loopback(f):
+    return guarded(f, check_loopback)
+
+
+def requires_auth(f):
+    return guarded(f, check_auth)
+
+
 def csrf_protect(f):
-    @wraps(f)
-    async def decorated(*args, **kwargs):
-        token = session.get("csrf_token")
-        header = request.headers.get("X-CSRF-Token")
-        cookie = request.cookies.get("csrf_token_" + runtime.get_runtime_id())
-        sent = header or cookie
-        if not token or not sent or token != sent:
-            return Response("CSRF token missing or invalid", 403)
-        return await f(*args, **kwargs)
+    return guarded(f, check_csrf)
 
-    return decorated
+
+# set once saved chats are loaded
+a0_ready = threading.Event()
+
+
+# readiness probe, 503 until initialization has finished
+@webapp.route("/ready", methods=["GET"])
+def serve_ready():
+    if a0_ready.is_set():
+        return Response("ready", 200)
+    return Response("initializing", 503)
 
 
 # handle default address, load index
@@ -218,20 +300,54 @@ async def serve_index():
     )
 
 
+# route ASGI requests by path prefix, like werkzeug's DispatcherMiddleware
+def asgi_dispatcher(default_app, mounts: dict):
+    async def app(scope, receive, send):
+        path = scope.get("path", "")
+        for prefix, mounted in mounts.items():
+            if path == prefix or path.startswith(prefix + "/"):
+                scope = dict(
+                    scope,
+                    root_path=scope.get("root_path", "") + prefix,
+                    path=path[len(prefix) :],
+                )
+                return await mounted(scope, receive, send)
+        return await default_app(scope, receive, send)
+
+    return app
+
+
+# API handlers from the registry generated by update_api_registry.py, folder scan in development
+def load_api_handlers() -> list[type[ApiHandler]]:
+    if not runtime.is_development():
+        try:
+            from python.api.__registry__ import HANDLERS, FILES
+
+            # handlers added or removed since the registry was generated need a scan
+            if set(FILES) == set(files.list_files("python/api", "[!_]*.py")):
+                return HANDLERS
+            PrintStyle().debug("API handler registry is out of date, scanning python/api")
+        except ImportError:
+            PrintStyle().debug("API handler registry not found, scanning python/api")
+    return load_classes_from_folder("python/api", "[!_]*.py", ApiHandler)
+
+
 def run():
     PrintStyle().print("Initializing framework...")
+    init_otel()
 
-    # Suppress only request logs but keep the startup messages
-    from werkzeug.serving import WSGIRequestHandler
-    from werkzeug.serving import make_server
-    from werkzeug.middleware.dispatcher import DispatcherMiddleware
-    from a2wsgi import ASGIMiddleware, WSGIMiddleware
+    import uvicorn
+    from a2wsgi import WSGIMiddleware
 
     PrintStyle().print("Starting server...")
 
-    class NoRequestLoggingWSGIRequestHandler(WSGIRequestHandler):
-        def log_request(self, code="-", size="-"):
-            pass  # Override to suppress request logging
+    # interface expected by process.stop_server, uvicorn.Server.shutdown is internal and async
+    class ServerHandle:
+        def __init__(self, server: uvicorn.Server):
+            self.server = server
+
+        def shutdown(self):
+            self.server.should_exit = True
 
     # Get configuration from environment
     port = runtime.get_web_ui_port()
@@ -242,70 +358,86 @@ def run():
 
     def register_api_handler(app, handler: type[ApiHandler]):
         name = handler.__module__.split(".")[-1]
-        instance = handler(app, lock)
+        instance = handler(app, locks)
 
         async def handler_wrap():
             return await instance.handle_request(request=request)
 
-        if handler.requires_loopback():
-            handler_wrap = requires_loopback(handler_wrap)
-        if handler.requires_auth():
-            handler_wrap = requires_auth(handler_wrap)
-        if handler.requires_api_key():
-            handler_wrap = requires_api_key(handler_wrap)
+        # checks run in the same order the stacked decorators used to
+        checks = []
         if handler.requires_csrf():
-            handler_wrap = csrf_protect(handler_wrap)
+            checks.append(check_csrf)
+        if handler.requires_api_key():
+            checks.append(check_api_key)
+        if handler.requires_auth():
+            checks.append(check_auth)
+        if handler.requires_loopback():
+            checks.append(check_loopback)
+        handler_wrap = guarded(handler_wrap, *checks)
 
         app.add_url_rule(
             f"/{name}",
             f"/{name}",
             handler_wrap,
-            methods=handler.get_methods(),
+            methods=tuple(handler.get_methods()),
+            strict_slashes=False,  # accept /name/ without a 308 redirect
         )
 
     # initialize and register API handlers
-    handlers = load_classes_from_folder("python/api", "*.py", ApiHandler)
+    handlers = load_api_handlers()
     for handler in handlers:
         register_api_handler(webapp, handler)
 
-    # add the webapp and mcp to the app
-    app = DispatcherMiddleware(
-        webapp,
-        {
-            "/mcp": ASGIMiddleware(app=mcp_server.DynamicMcpProxy.get_instance()),  # type: ignore
-        },
+    # add the webapp and mcp to the app, mcp is served natively as ASGI
+    app = asgi_dispatcher(
+        WSGIMiddleware(webapp, workers=64),  # type: ignore
+        {"/mcp": mcp_server.DynamicMcpProxy.get_instance()},
     )
     PrintStyle().debug("Registered middleware for MCP and MCP token")
 
     PrintStyle().debug(f"Starting server at {host}:{port}...")
 
-    server = make_server(
-        host=host,
-        port=port,
-        app=app,
-        request_handler=NoRequestLoggingWSGIRequestHandler,
-        threaded=True,
+    # plain asyncio loop, nest_asyncio is applied at import and cannot patch uvloop
+    server = uvicorn.Server(
+        uvicorn.Config(
+            app,
+            host=host,
+            port=port,
+            loop="asyncio",
+            log_level="warning",
+            access_log=False,
+            lifespan="off",
+            # long-lived /mcp streams never finish on their own, cancel them after this
+            timeout_graceful_shutdown=5,
+        )
     )
-    process.set_server(server)
-    server.log_startup()
+    process.set_server(ServerHandle(server))
+    PrintStyle().print(f"Running on http://{host}:{port}")
 
-    # Start init_a0 in a background thread when server starts
-    # threading.Thread(target=init_a0, daemon=True).start()
-    init_a0()
+    # load chats in the background, the server accepts requests meanwhile, /ready reports when done
+    threading.Thread(target=init_a0_slow, daemon=True).start()
+    init_a0_fast()
 
-    # run the server
-    server.serve_forever()
+    # run the server on our own loop, uvicorn's Server.run() goes through asyncio.run
+    # which nest_asyncio replaces with a version that does not accept loop_factory
+    asyncio.new_event_loop().run_until_complete(server.serve())
 
 
-def init_a0():
-    # initialize contexts and MCP
-    init_chats = initialize.initialize_chats()
+def init_a0_fast():
+    # initialize MCP
     initialize.initialize_mcp()
     # start job loop
     initialize.initialize_job_loop()
 
-    # only wait for init chats, otherwise they would seem to dissapear for a while on restart
-    init_chats.result_sync()
+
+def init_a0_slow():
+    # initialize contexts
+    try:
+        initialize.initialize_chats().result_sync()
+    except Exception as e:
+        PrintStyle.error(f"Failed to load chats: {errors.format_error(e)}")
+        return
+    a0_ready.set()
 
 
 # run the internal server
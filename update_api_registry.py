@@ -0,0 +1,34 @@
+from python.helpers.api import ApiHandler
+from python.helpers.extract_tools import load_classes_from_folder
+from python.helpers.files import get_abs_path, list_files
+
+API_FOLDER = "python/api"
+API_FILES = "[!_]*.py"
+REGISTRY_FILE = "python/api/__registry__.py"
+
+
+def update_registry():
+    # same discovery as the dynamic loader, files starting with _ are skipped
+    handlers = load_classes_from_folder(API_FOLDER, API_FILES, ApiHandler)
+    # scanned files, the loader falls back to scanning when these change
+    scanned = sorted(list_files(API_FOLDER, API_FILES))
+
+    lines = ["# generated by update_api_registry.py, do not edit", ""]
+    for handler in handlers:
+        lines.append(f"from {handler.__module__} import {handler.__name__}")
+    lines += ["", "HANDLERS = ["]
+    for handler in handlers:
+        lines.append(f"    {handler.__name__},")
+    lines.append("]")
+    lines += ["", "FILES = ["]
+    for file in scanned:
+        lines.append(f"    {file!r},")
+    lines.append("]")
+
+    with open(get_abs_path(REGISTRY_FILE), "w") as f:
+        f.write("\n".join(lines) + "\n")
+    print(f"Registered {len(handlers)} API handlers in {REGISTRY_FILE}")
+
+
+if __name__ == "__main__":
+    update_registry()